@@ -1,127 +1,407 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from dotenv import find_dotenv, load_dotenv
-from transformers import pipeline
+from transformers import BlipProcessor, BlipForConditionalGeneration
+from PIL import Image
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import requests
+import torch
+import hashlib
+import io
+import json
 import os
+import random
+import re
+import threading
+import wave
 
 # Load environment variables
 load_dotenv(find_dotenv())
 HUGGINGFACEHUB_API_TOKEN = os.getenv("HUGGINGFACEHUB_API_TOKEN")
 
-# Cache the models to avoid reloading
-@st.cache_resource
+BLIP_MODEL_ID = "Salesforce/blip-image-captioning-base"
+# Captions are short: greedy decoding with a tight token budget
+BLIP_GENERATE_KWARGS = {"num_beams": 1, "max_new_tokens": 20}
+# BLIP resizes to 384x384 anyway; shrink big uploads to this before preprocessing
+BLIP_MAX_INPUT_SIZE = (512, 512)
+# Captions kept in memory, keyed by image content hash
+CAPTION_CACHE_SIZE = 512
+# Stories and narration audio kept in st.cache_data (audio is the largest payload)
+STORY_CACHE_SIZE = 512
+AUDIO_CACHE_SIZE = 64
+
+# Threads per forward pass. Streamlit serves sessions concurrently, so each
+# inference gets a slice of the cores instead of all of them; benchmark on the
+# deployment host before raising it for heavier loads.
+def inference_threads():
+    """INFERENCE_THREADS if it is a valid count (clamped to at least 1), else a quarter of the cores"""
+    default = max(1, (os.cpu_count() or 1) // 4)
+    try:
+        return max(1, int(os.getenv("INFERENCE_THREADS", default)))
+    except ValueError:
+        return default
+
+INFERENCE_THREADS = inference_threads()
+
+# Optional local Piper voice: download en_US-lessac-low.onnx and its .onnx.json
+# config, and `pip install piper-phonemize` (wheels for a few platforms only, no
+# Windows). Without either, narration falls back to gTTS.
+PIPER_VOICE_PATH = os.getenv("PIPER_VOICE_PATH", "en_US-lessac-low.onnx")
+
+# Words that end the subject of a BLIP caption ("a dog sitting *on* a couch")
+STORY_CONNECTORS = {"on", "in", "with", "at", "of", "and", "near", "under", "by", "next",
+                    "over", "behind", "that", "is", "are", "up", "down", "from", "to"}
+# Words that are never the subject
+STORY_STOPWORDS = {"a", "an", "the", "two", "three", "four", "some", "several", "many",
+                   "there", "is", "are", "arafed", "araffe", "arafly"}
+# "<word> of" phrases that describe the picture rather than its subject ("a blurry photo of")
+STORY_PICTURE_WORDS = {"closeup", "photo", "photograph", "picture", "image", "painting",
+                       "drawing", "sketch", "illustration", "view", "shot", "group",
+                       "couple", "pair", "bunch"}
+# "-ing" words that are nouns, not the verb that ends the subject
+STORY_ING_NOUNS = {"building", "buildings", "ceiling", "painting", "paintings", "drawing",
+                   "clothing", "wedding", "ring", "king", "wing", "wings", "string",
+                   "swing", "spring", "evening", "morning", "icing", "railing", "awning"}
+
+# Story templates - all around 18-20 words, keyed on the image subject
+STORY_TEMPLATES = (
+    "The {subject} waited quietly as the light shifted. Nobody noticed, yet this small moment held a whole secret world.",
+    "Every morning the {subject} returned to this same spot, hoping someone would finally understand the story it carried.",
+    "Nobody expected the {subject} to change anything that day, but by sunset everyone was smiling without knowing why.",
+    "The {subject} had travelled far to reach this place. Now, resting quietly here, everything finally felt exactly right.",
+    "Years later, people still talked about the {subject}, and how one ordinary afternoon became a memory worth keeping.",
+    "Beneath the quiet surface, the {subject} held a promise. Today was the day that promise would finally come true.",
+    "A gentle breeze passed by the {subject}, carrying whispers of adventure and the warm feeling of coming home again.",
+    "The {subject} stood at the centre of it all, calm and patient, while the world slowly gathered around it.",
+    "Legend says the {subject} brings luck to anyone who notices it. Today, someone finally paused long enough to look.",
+    "Once, the {subject} was forgotten. Then a curious visitor arrived, and suddenly every detail sparkled with brand new meaning.",
+    "In that peaceful instant the {subject} seemed to breathe, reminding everyone nearby that simple moments are often the best.",
+    "The {subject} never asked for attention, yet it quietly became the heart of a story everyone wanted to hear.",
+    "Sunlight touched the {subject} just as laughter rose nearby. It was the kind of moment nobody ever truly forgets.",
+    "Long ago, someone placed their hopes in the {subject}. Today those hopes finally bloomed into something truly beautiful.",
+    "The {subject} held its breath as the day unfolded, sensing that something wonderful was about to happen very soon.",
+    "Nobody planned this scene, but the {subject} made it perfect, turning an ordinary day into a small, quiet celebration.",
+    "Stories travel in strange ways. This one began with the {subject}, a little patience, and a heart full of wonder.",
+    "As evening approached, the {subject} glowed softly, and everyone agreed this was the happiest they had been all year.",
+    "The {subject} remembered every season it had seen, but this bright, peaceful moment was the one it treasured most.",
+    "Somewhere between laughter and silence, the {subject} found its place, and the whole world seemed a little kinder.",
+)
+STORY_FALLBACK = "A beautiful moment captured in time. Everything seemed perfect in this peaceful scene worth remembering."
+
+@st.cache_resource(show_spinner=False)
+def configure_torch_threads():
+    """Pin PyTorch's thread pools once per process, before any inference runs"""
+    torch.set_num_threads(INFERENCE_THREADS)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Already set, or parallel work has started; can only be set once
+
+def ort_session_options():
+    """ONNX Runtime session options (for Piper) with the same thread budget as PyTorch"""
+    import onnxruntime
+    
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = INFERENCE_THREADS
+    options.inter_op_num_threads = 1
+    return options
+
+def cpu_has_native_bf16():
+    """Whether the CPU has native bf16 matmuls (AVX512_BF16 or AMX), per /proc/cpuinfo"""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            flags = set(f.read().split())
+    except OSError:
+        return False  # Not Linux; can't tell, so stay on FP32
+    
+    # Plain AVX-512 (Skylake, Cascade Lake) only emulates bf16, which is slower than FP32
+    return bool(flags & {"avx512_bf16", "amx_bf16"})
+
+def blip_dtype_and_device():
+    """FP16 on CUDA, BF16 on CPUs with native bf16 support, FP32 otherwise"""
+    if torch.cuda.is_available():
+        return torch.float16, "cuda"
+    
+    if cpu_has_native_bf16():
+        return torch.bfloat16, "cpu"
+    return torch.float32, "cpu"
+
+def compile_blip(processor, model):
+    """Compile the BLIP vision encoder and pay the compile cost with a warm-up caption"""
+    if not hasattr(torch, "compile"):  # torch < 2.0
+        return model
+    
+    vision_model = model.vision_model
+    try:
+        # Uploads are captioned in batches, so keep the batch dimension symbolic.
+        # Size 1 is always specialized, so warm up with 1 and 2 images; every
+        # larger batch then reuses the dynamic graph without recompiling.
+        model.vision_model = torch.compile(vision_model, mode="reduce-overhead", dynamic=True)
+        for batch_size in (1, 2):
+            warmup = processor([Image.new("RGB", (384, 384))] * batch_size, return_tensors="pt")
+            warmup = warmup.to(model.device, model.dtype)
+            with torch.inference_mode():
+                model.generate(**warmup, **BLIP_GENERATE_KWARGS)
+    except Exception as e:
+        st.warning(f"torch.compile unavailable, running eagerly: {str(e)[:100]}")
+        model.vision_model = vision_model
+    
+    return model
+
+# Cache the models to avoid reloading; loaded on a background thread, so no spinner
+@st.cache_resource(show_spinner=False)
 def load_img2text_model():
-    return pipeline("image-to-text", model="Salesforce/blip-image-captioning-base")
+    """Load BLIP processor and model in the best precision for this host"""
+    processor = BlipProcessor.from_pretrained(BLIP_MODEL_ID)
+    
+    dtype, device = blip_dtype_and_device()
+    model = BlipForConditionalGeneration.from_pretrained(BLIP_MODEL_ID, torch_dtype=dtype).to(device).eval()
+    model = compile_blip(processor, model)
+    
+    return processor, model
+
+@st.cache_resource(show_spinner=False)
+def start_model_warmup():
+    """Start loading BLIP on a background thread, once per process.
+    A caption request made before it finishes waits on load_img2text_model's cache"""
+    thread = threading.Thread(target=load_img2text_model, daemon=True)
+    thread.start()
+    return thread
+
+def decode_image(data):
+    """Decode uploaded bytes into an RGB image no larger than BLIP_MAX_INPUT_SIZE"""
+    image = Image.open(io.BytesIO(data))
+    if image.format == "JPEG":
+        # Before convert() loads pixels, so JPEGs can be downscaled while decoding
+        image.thumbnail(BLIP_MAX_INPUT_SIZE, Image.Resampling.BILINEAR)
+        return image.convert("RGB")
+    
+    # Other formats convert first: Pillow forces NEAREST on palette ("P") and "1" images
+    image = image.convert("RGB")
+    image.thumbnail(BLIP_MAX_INPUT_SIZE, Image.Resampling.BILINEAR)
+    return image
 
 @st.cache_resource
-def load_story_model():
-    """Load GPT-2 for local story generation"""
-    return pipeline(
-        "text-generation", 
-        model="gpt2",
-        pad_token_id=50256
-    )
+def caption_cache():
+    """Process-wide LRU of captions keyed by image content hash, with its lock"""
+    return OrderedDict(), threading.Lock()
 
-def img2text(image_path):
-    """Convert image to text description"""
+def caption_batch(images_bytes):
+    """Decode and caption raw image bytes in one batched pass"""
+    processor, model = load_img2text_model()
+    images = [decode_image(data) for data in images_bytes]
+    inputs = processor(images, return_tensors="pt")
+    # Match the model's device and half-precision dtype
+    inputs = inputs.to(model.device, model.dtype)
+    with torch.inference_mode():
+        output_ids = model.generate(**inputs, **BLIP_GENERATE_KWARGS)
+    return processor.batch_decode(output_ids, skip_special_tokens=True)
+
+def caption_images(images_bytes):
+    """Caption each image once by content; only cache misses go through BLIP, in one batch.
+    Errors propagate before anything is stored, so failures are never cached."""
+    cache, lock = caption_cache()
+    keys = [hashlib.blake2b(data).hexdigest() for data in images_bytes]
+    
+    with lock:
+        captions = {key: cache[key] for key in keys if key in cache}
+    misses = {key: data for key, data in zip(keys, images_bytes) if key not in captions}
+    
+    if misses:
+        captions.update(zip(misses, caption_batch(list(misses.values()))))
+    
+    with lock:
+        for key in keys:
+            cache[key] = captions[key]
+            cache.move_to_end(key)
+        while len(cache) > CAPTION_CACHE_SIZE:
+            cache.popitem(last=False)
+    
+    return [captions[key] for key in keys]
+
+def img2text(images_bytes):
+    """Convert uploaded image bytes to text descriptions"""
     try:
-        image_to_text = load_img2text_model()
-        text = image_to_text(image_path)[0]["generated_text"]
-        return text
+        return caption_images(list(images_bytes))
     except Exception as e:
         st.error(f"Error in image-to-text: {e}")
         return None
 
+def is_caption_verb(word, next_word):
+    """Whether a caption word is the verb that follows the subject ("sitting", "parked in")"""
+    if len(word) <= 4:
+        return False
+    if word.endswith("ing"):
+        return word not in STORY_ING_NOUNS
+    # "-ed" is a verb only before a new phrase: "a car parked in" but not "a stuffed animal"
+    return word.endswith("ed") and (next_word is None or next_word in STORY_CONNECTORS
+                                    or next_word in STORY_STOPWORDS)
+
+def extract_subject(scenario):
+    """Pick the main noun from a BLIP caption, i.e. the last word of its first noun phrase
+
+    Real BLIP captions it should handle:
+        a dog sitting on a couch                   -> dog
+        arafed woman holding an umbrella           -> woman
+        two cats laying on a bed                   -> cats
+        a red car parked in front of a building    -> car
+        there is a man that is standing            -> man
+        a close up of a cat                        -> cat
+        a close - up of a flower                   -> flower
+        a black and white photo of a man           -> man
+        an old black and white photo of a family   -> family
+        a blurry photo of a cat                    -> cat
+        an aerial view of a city                   -> city
+        a large building with a clock tower        -> building
+        a white ceiling fan                        -> fan
+        a tall building                            -> building
+        a group of people standing around a table  -> people
+        a large stuffed animal on a bed            -> animal
+        .                                          -> scene
+    """
+    # Letters only: BLIP decodes "close-up" as "close - up"
+    text = " ".join(re.findall(r"[a-z]+", scenario.lower()))
+    text = re.sub(r"\bclose up\b", "closeup", text)
+    text = re.sub(r"\bblack and white\b", " ", text)
+    words = text.split()
+    
+    head = []
+    for index, word in enumerate(words):
+        next_word = words[index + 1] if index + 1 < len(words) else None
+        # Skip articles and counts before the subject
+        if not head and word in STORY_STOPWORDS:
+            continue
+        # "a blurry photo of a cat": the subject comes after the picture description
+        if word == "of" and head and head[-1] in STORY_PICTURE_WORDS:
+            head = []
+            continue
+        # The subject ends where the first action or place phrase begins
+        if head and (word in STORY_CONNECTORS or word in STORY_STOPWORDS
+                     or is_caption_verb(word, next_word)):
+            break
+        head.append(word)
+    
+    return head[-1] if head else "scene"
+
+@st.cache_data(show_spinner=False, max_entries=STORY_CACHE_SIZE)
 def generate_story(scenario):
     """Generate a creative 20-word story DIRECTLY related to image description"""
     if not scenario:
         return None
     
+    return create_simple_story(scenario)
+
+def create_simple_story(scenario):
+    """Create a template-based story about the image subject (18-20 words)"""
     try:
-        story_generator = load_story_model()
-        
-        # Simpler, more reliable prompt
-        prompt = f"{scenario}. The story begins:"
-        
-        result = story_generator(
-            prompt,
-            max_length=80,  # Reduced for shorter output
-            num_return_sequences=1,
-            temperature=0.8,
-            top_p=0.9,
-            do_sample=True,
-            pad_token_id=50256,
-            repetition_penalty=1.5,
-            no_repeat_ngram_size=2
-        )
-        
-        # Extract story
-        full_text = result[0]['generated_text']
-        story = full_text.replace(prompt, "").strip()
-        
-        # Clean the story
-        story = story.split('\n')[0]
-        story = story.replace('  ', ' ')
-        story = story.strip()
-        
-        # If story is empty or too short, create a simple one
-        if len(story) < 10:
-            # Fallback: create a simple descriptive story
-            story = create_simple_story(scenario)
-        else:
-            # Get 18-20 words
-            words = story.split()[:20]
-            story = " ".join(words)
-        
-        # Ensure proper ending
-        if story and not story.endswith(('.', '!', '?')):
-            story += '.'
+        return random.choice(STORY_TEMPLATES).format(subject=extract_subject(scenario))
+    except:
+        return STORY_FALLBACK
+
+@st.cache_resource
+def load_piper_voice():
+    """Load the Piper ONNX voice and its config, or None unless both are downloaded"""
+    if not (os.path.exists(PIPER_VOICE_PATH) and os.path.exists(f"{PIPER_VOICE_PATH}.json")):
+        return None
+    
+    import onnxruntime
+    
+    with open(f"{PIPER_VOICE_PATH}.json", encoding="utf-8") as f:
+        config = json.load(f)
+    session = onnxruntime.InferenceSession(
+        PIPER_VOICE_PATH,
+        sess_options=ort_session_options(),
+        providers=["CPUExecutionProvider"]
+    )
+    return session, config
+
+def text2speech_piper(message):
+    """Synthesize WAV bytes locally with a Piper voice - no network needed"""
+    from piper_phonemize import phonemize_espeak
+    
+    session, config = load_piper_voice()
+    id_map = config["phoneme_id_map"]
+    inference = config.get("inference", {})
+    scales = np.array([
+        inference.get("noise_scale", 0.667),
+        inference.get("length_scale", 1.0),
+        inference.get("noise_w", 0.8)
+    ], dtype=np.float32)
+    
+    chunks = []
+    for phonemes in phonemize_espeak(message, config["espeak"]["voice"]):
+        # BOS, then each phoneme followed by padding, then EOS
+        ids = list(id_map["^"])
+        for phoneme in phonemes:
+            if phoneme in id_map:
+                ids.extend(id_map[phoneme])
+                ids.extend(id_map["_"])
+        ids.extend(id_map["$"])
         
-        return story if story else create_simple_story(scenario)
+        audio = session.run(None, {
+            "input": np.array([ids], dtype=np.int64),
+            "input_lengths": np.array([len(ids)], dtype=np.int64),
+            "scales": scales
+        })[0]
+        chunks.append(audio.squeeze())
     
-    except Exception as e:
-        st.warning(f"Model error: {str(e)[:100]}")
-        # Use fallback
-        return create_simple_story(scenario)
+    audio = np.concatenate(chunks)
+    audio = audio * (32767 / max(0.01, np.max(np.abs(audio))))
+    pcm = np.clip(audio, -32767, 32767).astype(np.int16)
+    
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(config["audio"]["sample_rate"])
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
 
-def create_simple_story(scenario):
-    """Create a simple template-based story when model fails (18-20 words)"""
+def synth_gtts(text):
+    """Synthesize MP3 bytes with gTTS, one concurrent request per sentence"""
+    from gtts import gTTS
+    
+    def synthesize(sentence):
+        buffer = io.BytesIO()
+        gTTS(text=sentence, lang='en', slow=False).write_to_fp(buffer)
+        return buffer.getvalue()
+    
+    sentences = [s for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
+    
+    # MP3 frames concatenate cleanly, so the sentences can be fetched in parallel
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        chunks = list(executor.map(synthesize, sentences))
+    
+    return b"".join(chunks)
+
+@st.cache_data(show_spinner=False, max_entries=AUDIO_CACHE_SIZE)
+def synth_audio(text):
+    """Synthesize (audio bytes, format, warning): local Piper WAV, falling back to gTTS MP3"""
+    warning = None
     try:
-        # Simple story templates - all around 18-20 words
-        templates = [
-            "This moment captured pure joy. The scene unfolded naturally, revealing beauty in everyday life and creating lasting memories.",
-            "Something magical happened here. Every detail told its own story. The atmosphere felt warm and inviting throughout.",
-            "In this peaceful moment, everything aligned perfectly. Nature and comfort blended together, creating harmony and contentment.",
-            "Life's beautiful moments appear unexpectedly. This scene embodied warmth. Each element contributed to the peaceful atmosphere.",
-            "A snapshot of happiness captured here. The setting provided comfort and joy, making everything come alive beautifully."
-        ]
-        
-        import random
-        story = random.choice(templates)
-        
-        return story
-    except:
-        return "A beautiful moment captured in time. Everything seemed perfect in this peaceful scene worth remembering."
+        if load_piper_voice() is not None:
+            return text2speech_piper(text), "wav", None
+    except Exception as e:
+        warning = f"Piper TTS failed, using gTTS: {str(e)[:100]}"
+    
+    return synth_gtts(text), "mp3", warning
 
-def text2speech_gtts(message, output_file="audio.mp3"):
-    """Convert text to speech using gTTS - optimized for ~10 seconds"""
+def text2speech(message):
+    """Convert text to speech, cached by text. Returns (audio, warning, error), where
+    audio is (bytes, format) or None. Never calls st, so it is safe on worker threads"""
     if not message:
-        return False
+        return None, None, None
     
     try:
-        from gtts import gTTS
-        
-        # Create speech with slightly slower speed for clarity
-        tts = gTTS(text=message, lang='en', slow=False)
-        tts.save(output_file)
-        return True
+        audio_bytes, audio_format, warning = synth_audio(message)
+        return (audio_bytes, audio_format), warning, None
     
     except ImportError:
-        st.error("gTTS not installed. Run: pip install gtts")
-        return False
+        return None, None, "gTTS not installed. Run: pip install gtts"
     except Exception as e:
-        st.error(f"Error in text-to-speech: {e}")
-        return False
+        return None, None, f"Error in text-to-speech: {e}"
 
 def text2speech_pyttsx3(message, output_file="audio.mp3"):
     
@@ -149,100 +429,133 @@ def text2speech_pyttsx3(message, output_file="audio.mp3"):
         st.error(f"Error in text-to-speech: {e}")
         return False
 
+def submit_with_script_context(executor, fn, *args):
+    """Submit fn to a worker thread that can still use st.cache_data (fn must not render)"""
+    ctx = get_script_run_ctx()
+    
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    
+    return executor.submit(run)
+
+def show_story_and_audio(scenario, story, audio_future, index):
+    """Render the story, then wait for its background audio narration"""
+    # Show image description first
+    with st.expander("📝 What AI Sees in Your Image", expanded=True):
+        st.info(f"🔍 **{scenario}**")
+        st.caption("↓ The story continues from this scene ↓")
+    
+    if story:
+        st.success("✅ Story generated!")
+        
+        # Count words and check uniqueness
+        words = story.split()
+        word_count = len(words)
+        unique_words = len(set(words))
+        
+        with st.expander("📖 Generated Story (Continues from Image)", expanded=True):
+            # Show the full narrative
+            st.write("**Complete Story:**")
+            st.write(f"*{scenario}. {story}*")
+            
+            st.divider()
+            col1, col2 = st.columns(2)
+            with col1:
+                st.caption(f"📊 Total words: {word_count}")
+            with col2:
+                st.caption(f"✨ Unique words: {unique_words}")
+        
+        with st.spinner("🎙️ Creating audio narration..."):
+            # Only the player waits; the story above is already on screen
+            audio, warning, error = audio_future.result()
+        
+        # Worker messages are rendered here so they land in this image's section
+        if warning:
+            st.warning(warning)
+        
+        if audio:
+            # The same in-memory bytes feed both the player and the download
+            audio_bytes, audio_format = audio
+            st.success("✅ Audio generated successfully!")
+            st.audio(audio_bytes, format=f"audio/{audio_format}")
+            
+            # Download button
+            st.download_button(
+                label="📥 Download Audio",
+                data=audio_bytes,
+                file_name=f"story_audio_{index + 1}.{audio_format}",
+                mime=f"audio/{audio_format}",
+                key=f"download_audio_{index}"
+            )
+        else:
+            st.error(error or "Failed to generate audio. Make sure gtts is installed: pip install gtts")
+            
+            # Show debug info
+            with st.expander("🔧 Troubleshooting"):
+                st.write("If audio fails:")
+                st.code("pip install --upgrade gtts")
+                st.write("Make sure you have internet connection for gTTS.")
+    else:
+        st.error("⚠️ Story generation had issues, but don't worry!")
+        st.info("Try:")
+        st.write("1. Click the button again")
+        st.write("2. Try a different image")
+        st.write("3. Restart the app if problem persists")
+
 def main():
     st.set_page_config(page_title="Image to Audio Story", page_icon="🤖")
     
+    configure_torch_threads()
+    
     st.header("Turn Image into Audio Story 🎭🔊")
     st.write("Upload an image and I'll create a story and narrate it for you!")
     
     # Info box
     st.info("✨ **100% FREE** -! Stories are 18-20 words")
     
-    uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"])
+    uploaded_files = st.file_uploader(
+        "Choose one or more images...",
+        type=["jpg", "jpeg", "png"],
+        accept_multiple_files=True
+    )
     
-    if uploaded_file is not None:
-        # Display the uploaded image
-        st.image(uploaded_file, caption='Uploaded Image', use_column_width=True)
-        
-        # Save the uploaded file temporarily
-        bytes_data = uploaded_file.getvalue()
-        with open(uploaded_file.name, "wb") as file:
-            file.write(bytes_data)
+    # Load the model in the background while the user is still picking a file
+    start_model_warmup()
+    
+    if uploaded_files:
+        # Display the uploaded images
+        for uploaded_file in uploaded_files:
+            st.image(uploaded_file, caption=uploaded_file.name, use_column_width=True)
         
         # Process button
         if st.button("🚀 Generate Story and Audio", type="primary"):
-            with st.spinner("🔍 Analyzing image..."):
-                scenario = img2text(uploaded_file.name)
+            with st.spinner("🔍 Analyzing images..."):
+                # One batched BLIP pass for all uploads
+                scenarios = img2text(uploaded_file.getvalue() for uploaded_file in uploaded_files)
             
-            if scenario:
-                # Show image description first
-                with st.expander("📝 What AI Sees in Your Image", expanded=True):
-                    st.info(f"🔍 **{scenario}**")
-                    st.caption("↓ The story continues from this scene ↓")
-                
-                with st.spinner("✍️ Creating story from the image scene..."):
-                    story = generate_story(scenario)
+            if scenarios:
+                with st.spinner("✍️ Creating stories from the image scenes..."):
+                    stories = [generate_story(scenario) for scenario in scenarios]
                 
-                if story:
-                    st.success("✅ Story generated!")
-                    
-                    # Count words and check uniqueness
-                    words = story.split()
-                    word_count = len(words)
-                    unique_words = len(set(words))
+                # Narrate the complete stories in the background while they render
+                executor = ThreadPoolExecutor(max_workers=2)
+                try:
+                    audio_futures = [
+                        submit_with_script_context(executor, text2speech, f"{scenario}. {story}")
+                        if story else None
+                        for scenario, story in zip(scenarios, stories)
+                    ]
                     
-                    with st.expander("📖 Generated Story (Continues from Image)", expanded=True):
-                        # Show the full narrative
-                        st.write("**Complete Story:**")
-                        st.write(f"*{scenario}. {story}*")
-                        
-                        st.divider()
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.caption(f"📊 Total words: {word_count}")
-                        with col2:
-                            st.caption(f"✨ Unique words: {unique_words}")
-                    
-                    with st.spinner("🎙️ Creating audio narration..."):
-                        # Narrate the complete story with context
-                        full_narrative = f"{scenario}. {story}"
-                        success = text2speech_gtts(full_narrative, "audio.mp3")
-                        audio_file = "audio.mp3"
-                    
-                    if success and os.path.exists(audio_file):
-                        st.success("✅ Audio generated successfully!")
-                        st.audio(audio_file)
-                        
-                        # Download button
-                        with open(audio_file, "rb") as audio:
-                            st.download_button(
-                                label="📥 Download Audio",
-                                data=audio,
-                                file_name="story_audio.mp3",
-                                mime="audio/mp3"
-                            )
-                    else:
-                        st.error("Failed to generate audio. Make sure gtts is installed: pip install gtts")
-                        
-                        # Show debug info
-                        with st.expander("🔧 Troubleshooting"):
-                            st.write("If audio fails:")
-                            st.code("pip install --upgrade gtts")
-                            st.write("Make sure you have internet connection for gTTS.")
-                else:
-                    st.error("⚠️ Story generation had issues, but don't worry!")
-                    st.info("This can happen with the free GPT-2 model. Try:")
-                    st.write("1. Click the button again")
-                    st.write("2. Try a different image")
-                    st.write("3. Restart the app if problem persists")
+                    for index, uploaded_file in enumerate(uploaded_files):
+                        if len(uploaded_files) > 1:
+                            st.subheader(f"🖼️ {uploaded_file.name}")
+                        show_story_and_audio(scenarios[index], stories[index], audio_futures[index], index)
+                finally:
+                    # On a rerun or stop, don't hold the script for queued narrations
+                    executor.shutdown(wait=False, cancel_futures=True)
             else:
-                st.error("Failed to analyze image. Please try another image.")
-            
-            # Clean up temporary file
-            try:
-                os.remove(uploaded_file.name)
-            except:
-                pass
+                st.error("Failed to analyze images. Please try other images.")
     
     # Sidebar info
     with st.sidebar: